@@ -1,151 +1,289 @@
+import heapq
 import json
 import os
 import re
-from typing import List, Dict, Tuple, Any
+from typing import List, Dict, Tuple, Any, FrozenSet
 import fitz  # PyMuPDF
 from collections import defaultdict, Counter
 from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import ahocorasick  # pyahocorasick
+except ImportError:  # optional; fall back to token counting
+    ahocorasick = None
+
+try:
+    import orjson
+except ImportError:  # optional; results are written with the stdlib json module
+    orjson = None
+
+@lru_cache(maxsize=32)
+def _keyword_automaton(relevant_keywords: FrozenSet[str]):
+    # Keywords are padded with spaces so they only match whole (space-normalised) tokens
+    automaton = ahocorasick.Automaton()
+    for keyword in relevant_keywords:
+        automaton.add_word(f' {keyword} ', keyword)
+    automaton.make_automaton()
+    return automaton
+
+def _count_phrase(padded: str, phrase: str) -> int:
+    # Occurrences of a multi-word keyword in space-padded text; a match's trailing
+    # space is reused as the next match's leading one so repeats aren't skipped
+    needle = f' {phrase} '
+    count = 0
+    index = padded.find(needle)
+    while index != -1:
+        count += 1
+        index = padded.find(needle, index + len(needle) - 1)
+    return count
+
+def _count_keyword_matches(text_lower: str, relevant_keywords: FrozenSet[str]) -> Tuple[int, int]:
+    # Returns (keyword hits, word count); multi-word keywords such as 'related work' count once
+    words = text_lower.split()
+    if not words or not relevant_keywords:
+        return 0, len(words)
+
+    padded = ' ' + ' '.join(words) + ' '
+    if ahocorasick is not None:
+        matches = sum(1 for _ in _keyword_automaton(relevant_keywords).iter(padded))
+        return matches, len(words)
+
+    word_counts = Counter(words)
+    matches = 0
+    for keyword in relevant_keywords:
+        if ' ' in keyword:
+            matches += _count_phrase(padded, keyword)
+        else:
+            matches += word_counts[keyword]
+    return matches, len(words)
+
+def _keyword_ratio(text_lower: str, relevant_keywords: FrozenSet[str]) -> float:
+    # Fraction of words that are persona/job keywords
+    matches, total_words = _count_keyword_matches(text_lower, relevant_keywords)
+    if total_words:
+        return matches / total_words
+    return 0.0
+
+@lru_cache(maxsize=4096)
+def _score_text(text_lower: str, relevant_keywords: FrozenSet[str]) -> float:
+    # Memoised _keyword_ratio for short subsection chunks; whole sections are scored
+    # once each, so they go through _keyword_ratio directly and aren't kept as keys
+    return _keyword_ratio(text_lower, relevant_keywords)
 
 class PersonaDrivenAnalyzer:
-    def __init__(self):
-        # Domain-specific keywords for different personas
-        self.persona_keywords = {
-            'researcher': {
-                'methodology', 'approach', 'method', 'algorithm', 'experiment', 'results',
-                'analysis', 'evaluation', 'performance', 'dataset', 'benchmark', 'model',
-                'framework', 'technique', 'implementation', 'validation', 'comparison'
-            },
-            'student': {
-                'definition', 'concept', 'principle', 'theory', 'example', 'formula',
-                'equation', 'problem', 'solution', 'exercise', 'practice', 'review',
-                'summary', 'key points', 'important', 'remember', 'note'
-            },
-            'analyst': {
-                'trend', 'growth', 'revenue', 'profit', 'loss', 'market', 'share',
-                'competition', 'strategy', 'performance', 'metrics', 'kpi', 'roi',
-                'investment', 'financial', 'economic', 'business', 'analysis'
-            },
-            'journalist': {
-                'news', 'report', 'investigation', 'source', 'evidence', 'fact',
-                'statement', 'interview', 'quote', 'development', 'event', 'incident',
-                'story', 'coverage', 'breaking', 'update', 'announcement'
-            }
-        }
+    # Domain-specific keywords for different personas
+    persona_keywords = {
+        'researcher': frozenset({
+            'methodology', 'approach', 'method', 'algorithm', 'experiment', 'results',
+            'analysis', 'evaluation', 'performance', 'dataset', 'benchmark', 'model',
+            'framework', 'technique', 'implementation', 'validation', 'comparison'
+        }),
+        'student': frozenset({
+            'definition', 'concept', 'principle', 'theory', 'example', 'formula',
+            'equation', 'problem', 'solution', 'exercise', 'practice', 'review',
+            'summary', 'key points', 'important', 'remember', 'note'
+        }),
+        'analyst': frozenset({
+            'trend', 'growth', 'revenue', 'profit', 'loss', 'market', 'share',
+            'competition', 'strategy', 'performance', 'metrics', 'kpi', 'roi',
+            'investment', 'financial', 'economic', 'business', 'analysis'
+        }),
+        'journalist': frozenset({
+            'news', 'report', 'investigation', 'source', 'evidence', 'fact',
+            'statement', 'interview', 'quote', 'development', 'event', 'incident',
+            'story', 'coverage', 'breaking', 'update', 'announcement'
+        })
+    }
+
+    # Job-specific importance indicators
+    job_keywords = {
+        'literature_review': frozenset({
+            'related work', 'previous studies', 'existing research', 'methodology',
+            'findings', 'contributions', 'limitations', 'future work', 'comparison'
+        }),
+        'exam_preparation': frozenset({
+            'key concepts', 'important', 'definition', 'formula', 'example',
+            'problem', 'solution', 'practice', 'review', 'summary', 'theorem'
+        }),
+        'financial_analysis': frozenset({
+            'revenue', 'profit', 'loss', 'growth', 'trend', 'performance',
+            'investment', 'market', 'competition', 'strategy', 'forecast'
+        })
+    }
+    _job_tokens = {job_type: tuple(job_type.split('_')) for job_type in job_keywords}
 
-        # Job-specific importance indicators
-        self.job_keywords = {
-            'literature_review': {
-                'related work', 'previous studies', 'existing research', 'methodology',
-                'findings', 'contributions', 'limitations', 'future work', 'comparison'
-            },
-            'exam_preparation': {
-                'key concepts', 'important', 'definition', 'formula', 'example',
-                'problem', 'solution', 'practice', 'review', 'summary', 'theorem'
-            },
-            'financial_analysis': {
-                'revenue', 'profit', 'loss', 'growth', 'trend', 'performance',
-                'investment', 'market', 'competition', 'strategy', 'forecast'
-            }
-        }
+    def __init__(self):
+        # Section heading patterns, combined into one precompiled alternation
+        self._heading_re = re.compile(
+            r'^(?:\d+\.\s+'
+            r'|[A-Z][A-Z\s]+$'
+            r'|(?:Abstract|Introduction|Conclusion|References|Methods?|Results|Discussion)$'
+            r'|(?:Chapter|Section)\s+\d+)',
+            re.IGNORECASE
+        )
+        # Dotted-number prefixes ("3.2 Setup") that the heading patterns above don't cover
+        self._numbered_re = re.compile(r'^\d+(?:\.\d+)*\.?\s')
+        # Sentence boundaries: map '!' and '?' to '.' and split on '.'
+        self._sent_trans = str.maketrans('!?', '..')
 
     def extract_document_content(self, pdf_path: str) -> Dict[str, Any]:
-        doc = fitz.open(pdf_path)
-        content = {
-            'title': '',
-            'sections': [],
-            'full_text': '',
-            'metadata': {
-                'pages': len(doc),
-                'filename': os.path.basename(pdf_path)
+        with fitz.open(pdf_path) as doc:
+            content = {
+                'title': '',
+                'sections': [],
+                'metadata': {
+                    'pages': len(doc),
+                    'filename': os.path.basename(pdf_path)
+                }
             }
-        }
-
-        all_text = []
-        current_section = None
 
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            blocks = page.get_text("dict")
-
-            for block in blocks["blocks"]:
-                if "lines" in block:
-                    for line in block["lines"]:
-                        line_text = ""
+            current_section = None
+
+            for page_num, page in enumerate(doc):
+                # One MuPDF text pass per page; "blocks" and, when needed, "dict" both read it
+                textpage = page.get_textpage()
+                font_blocks = None
+
+                for block in page.get_text("blocks", textpage=textpage):
+                    # (x0, y0, x1, y1, text, block_no, block_type); type 1 is an image
+                    if block[6] != 0:
+                        continue
+
+                    block_lines = [line.strip() for line in block[4].split('\n')]
+                    block_lines = [line for line in block_lines if line]
+                    if not block_lines:
+                        continue
+
+                    if not self.is_heading_candidate(block_lines):
+                        # Plain body text: no font info needed, so skip the "dict" extraction
+                        if current_section:
+                            current_section['content'].extend(
+                                {'text': line_text, 'page': page_num + 1} for line_text in block_lines
+                            )
+                        continue
+
+                    # Heading candidate: per-line font size and flags come from the page's
+                    # "dict" output, built at most once per page and matched by block number
+                    if font_blocks is None:
+                        font_blocks = {
+                            font_block["number"]: font_block
+                            for font_block in page.get_text("dict", textpage=textpage)["blocks"]
+                        }
+                    font_lines = []
+                    for line in font_blocks.get(block[5], {}).get("lines", ()):
+                        parts = []
+                        max_size = 0
+                        flags = 0
                         for span in line["spans"]:
-                            line_text += span["text"]
-
-                        line_text = line_text.strip()
+                            parts.append(span["text"])
+                            if span.get("size", 12) > max_size:
+                                max_size = span.get("size", 12)
+                            flags |= span.get("flags", 0)
+                        line_text = "".join(parts).strip()
                         if line_text:
-                            all_text.append(line_text)
-
-                            if self.is_section_heading(line_text, span.get("size", 12), span.get("flags", 0)):
-                                if current_section:
-                                    content['sections'].append(current_section)
-                                current_section = {
-                                    'title': line_text,
-                                    'page': page_num + 1,
-                                    'content': [],
-                                    'subsections': []
-                                }
-                            elif current_section:
-                                current_section['content'].append({
-                                    'text': line_text,
-                                    'page': page_num + 1
-                                })
+                            font_lines.append((line_text, max_size, flags))
+                    if not font_lines:
+                        font_lines = [(line_text, 12, 0) for line_text in block_lines]
+
+                    for line_text, max_size, flags in font_lines:
+                        if self.is_section_heading(line_text, max_size, flags):
+                            if current_section:
+                                content['sections'].append(current_section)
+                            current_section = {
+                                'title': line_text,
+                                'page': page_num + 1,
+                                'content': [],
+                                'subsections': []
+                            }
+                        elif current_section:
+                            current_section['content'].append({
+                                'text': line_text,
+                                'page': page_num + 1
+                            })
 
         if current_section:
             content['sections'].append(current_section)
 
-        content['full_text'] = ' '.join(all_text)
+        # Columnar copy of the fields scoring reads (one list per field, indexed like
+        # content['sections']); see score_sections
+        content['columns'] = {
+            'titles': [section['title'] for section in content['sections']],
+            'content_lower': [
+                ' '.join(item['text'] for item in section['content']).lower()
+                for section in content['sections']
+            ],
+        }
 
         if content['sections']:
             content['title'] = content['sections'][0]['title']
         else:
             content['title'] = content['metadata']['filename'].replace('.pdf', '')
 
-        doc.close()
         return content
 
+    def is_heading_candidate(self, lines: List[str]) -> bool:
+        # Cheap prefilter on a block's stripped, non-empty lines. PyMuPDF often merges
+        # a bold heading into the block of the paragraph around it, so a block may hold
+        # a heading if it is a single short line, if any line matches the heading
+        # patterns or starts with a dotted number ("3.2 Setup"), or if a line is either
+        # a short first line or clearly shorter than the block's wrapped body lines.
+        # Only full-width lines ending a sentence are ruled out as plain body text
+        if len(lines) == 1:
+            return 3 <= len(lines[0]) <= 150
+        widest = max(len(line) for line in lines)
+        for index, line in enumerate(lines):
+            if not 3 <= len(line) <= 150:
+                continue
+            if self._heading_re.match(line) or self._numbered_re.match(line):
+                return True
+            clearly_shorter = len(line) * 3 <= widest * 2
+            if line[-1] in '.!?' and not clearly_shorter:
+                continue
+            if clearly_shorter or (index == 0 and len(line) <= 80):
+                return True
+        return False
+
     def is_section_heading(self, text: str, font_size: float, font_flags: int) -> bool:
         text_clean = text.strip()
         if len(text_clean) < 3 or len(text_clean) > 150:
             return False
 
-        heading_patterns = [
-            r'^\d+\.\s+',
-            r'^[A-Z][A-Z\s]+$',
-            r'^(Abstract|Introduction|Conclusion|References|Methods?|Results|Discussion)$',
-            r'^(Chapter|Section)\s+\d+',
-        ]
-
-        for pattern in heading_patterns:
-            if re.match(pattern, text_clean, re.IGNORECASE):
-                return True
+        if self._heading_re.match(text_clean):
+            return True
 
         is_bold = font_flags & 2**4
         return is_bold and font_size > 11
 
-    def calculate_section_relevance(self, section: Dict, persona: str, job: str) -> float:
+    @classmethod
+    def _resolve_keywords(cls, persona: str, job: str) -> FrozenSet[str]:
+        return cls._keywords_for(persona.lower(), job.lower())
+
+    @classmethod
+    @lru_cache(maxsize=64)
+    def _keywords_for(cls, persona_lower: str, job_lower: str) -> FrozenSet[str]:
+        # Cached on the lowercased (persona, job) pair only; no analyzer instance is kept alive
+        matched = [keywords for p_type, keywords in cls.persona_keywords.items() if p_type in persona_lower]
+        matched.extend(
+            keywords for job_type, keywords in cls.job_keywords.items()
+            if any(word in job_lower for word in cls._job_tokens[job_type])
+        )
+        return frozenset().union(*matched)
+
+    def score_sections(self, columns: Dict[str, List[str]], relevant_keywords: FrozenSet[str]) -> List[float]:
+        return [
+            self._score_section_text(title.lower(), text, relevant_keywords)
+            for title, text in zip(columns['titles'], columns['content_lower'])
+        ]
+
+    def _score_section_text(self, section_text: str, content_text: str, relevant_keywords: FrozenSet[str]) -> float:
         score = 0.0
-        section_text = section['title'].lower()
-        content_text = ' '.join([item['text'] for item in section['content']]).lower()
-        full_text = section_text + ' ' + content_text
-
-        persona_lower = persona.lower()
-        relevant_keywords = set()
-        for p_type, keywords in self.persona_keywords.items():
-            if p_type in persona_lower:
-                relevant_keywords.update(keywords)
-
-        job_lower = job.lower()
-        for job_type, keywords in self.job_keywords.items():
-            if any(word in job_lower for word in job_type.split('_')):
-                relevant_keywords.update(keywords)
-
-        words = full_text.split()
-        matches = sum(1 for word in words if word in relevant_keywords)
-        if words:
-            score += (matches / len(words)) * 10
+
+        # No persona/job keywords: only the structural bonuses below can apply
+        if relevant_keywords:
+            full_text = section_text + ' ' + content_text
+            score += _keyword_ratio(full_text, relevant_keywords) * 10
 
         if any(imp in section_text for imp in ['abstract', 'introduction', 'conclusion', 'summary', 'results', 'methodology']):
             score += 2
@@ -157,32 +295,56 @@ class PersonaDrivenAnalyzer:
 
         return score
 
-    def extract_subsections(self, section: Dict, persona: str, job: str) -> List[Dict]:
+    def extract_subsections(self, section: Dict, relevant_keywords: FrozenSet[str]) -> List[Dict]:
         subsections = []
         if not section['content']:
             return subsections
 
-        current_text = ""
+        # Split the whole section in one pass; item start offsets map sentences back to pages
+        parts = []
+        item_offsets = []
+        item_pages = []
+        offset = 0
         for item in section['content']:
-            text = item['text'].strip()
-            sentences = re.split(r'[.!?]+', text)
-            for sentence in sentences:
-                sentence = sentence.strip()
-                if len(sentence) > 20:
-                    current_text += sentence + ". "
-                    if len(current_text) > 300:
-                        relevance_score = self.calculate_text_relevance(current_text, persona, job)
-                        if relevance_score > 0.3:
-                            subsections.append({
-                                'document': section.get('document', ''),
-                                'page_number': item['page'],
-                                'refined_text': current_text.strip(),
-                                'relevance_score': relevance_score
-                            })
-                        current_text = ""
-
-        if current_text.strip():
-            relevance_score = self.calculate_text_relevance(current_text, persona, job)
+            parts.append(item['text'])
+            item_offsets.append(offset)
+            item_pages.append(item['page'])
+            offset += len(item['text']) + 1
+        joined = " ".join(parts)
+
+        buf = []
+        cur_len = 0
+        pos = 0
+        item_idx = 0
+        for raw_sentence in joined.translate(self._sent_trans).split('.'):
+            # Locate the sentence by its first non-space character; the space before it
+            # is the separator that still belongs to the previous item
+            start = pos + len(raw_sentence) - len(raw_sentence.lstrip())
+            while item_idx + 1 < len(item_offsets) and item_offsets[item_idx + 1] <= start:
+                item_idx += 1
+            pos += len(raw_sentence) + 1
+
+            sentence = raw_sentence.strip()
+            if len(sentence) > 20:
+                buf.append(sentence)
+                buf.append(". ")
+                cur_len += len(sentence) + 2
+                if cur_len > 300:
+                    current_text = "".join(buf)
+                    relevance_score = self.calculate_text_relevance(current_text, relevant_keywords)
+                    if relevance_score > 0.3:
+                        subsections.append({
+                            'document': section.get('document', ''),
+                            'page_number': item_pages[item_idx],
+                            'refined_text': current_text.strip(),
+                            'relevance_score': relevance_score
+                        })
+                    buf.clear()
+                    cur_len = 0
+
+        if buf:
+            current_text = "".join(buf)
+            relevance_score = self.calculate_text_relevance(current_text, relevant_keywords)
             if relevance_score > 0.3:
                 subsections.append({
                     'document': section.get('document', ''),
@@ -191,54 +353,38 @@ class PersonaDrivenAnalyzer:
                     'relevance_score': relevance_score
                 })
 
-        subsections.sort(key=lambda x: x['relevance_score'], reverse=True)
-        return subsections[:5]
-
-    def calculate_text_relevance(self, text: str, persona: str, job: str) -> float:
-        text_lower = text.lower()
-        relevant_keywords = set()
+        return heapq.nlargest(5, subsections, key=lambda x: x['relevance_score'])
 
-        persona_lower = persona.lower()
-        for p_type, keywords in self.persona_keywords.items():
-            if p_type in persona_lower:
-                relevant_keywords.update(keywords)
+    def calculate_text_relevance(self, text: str, relevant_keywords: FrozenSet[str]) -> float:
+        if not relevant_keywords:
+            return 0.0
 
-        job_lower = job.lower()
-        for job_type, keywords in self.job_keywords.items():
-            if any(word in job_lower for word in job_type.split('_')):
-                relevant_keywords.update(keywords)
-
-        words = text_lower.split()
-        if words:
-            matches = sum(1 for word in words if word in relevant_keywords)
-            return matches / len(words)
-        return 0.0
+        return _score_text(text.lower(), relevant_keywords)
 
     def analyze_documents(self, documents: List[str], persona: str, job: str) -> Dict:
         all_sections = []
         document_contents = {}
-
-        for doc_path in documents:
-            try:
-                content = self.extract_document_content(doc_path)
+        relevant_keywords = self._resolve_keywords(persona, job)
+
+        workers = max(1, min(len(documents), os.cpu_count() or 1))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_extract_and_score, doc_path, relevant_keywords) for doc_path in documents]
+            for doc_path, future in zip(documents, futures):
+                try:
+                    _, content = future.result()
+                except Exception as e:
+                    print(f"Error processing {doc_path}: {str(e)}")
+                    continue
                 document_contents[doc_path] = content
-                for section in content['sections']:
-                    section['document'] = os.path.basename(doc_path)
-                    relevance_score = self.calculate_section_relevance(section, persona, job)
-                    section['importance_rank'] = relevance_score
-                    all_sections.append(section)
-            except Exception as e:
-                print(f"Error processing {doc_path}: {str(e)}")
-                continue
+                all_sections.extend(content['sections'])
 
-        all_sections.sort(key=lambda x: x['importance_rank'], reverse=True)
-        top_sections = all_sections[:10]
+        top_sections = heapq.nlargest(10, all_sections, key=lambda x: x['importance_rank'])
         all_subsections = []
         for section in top_sections[:5]:
-            subsections = self.extract_subsections(section, persona, job)
+            subsections = self.extract_subsections(section, relevant_keywords)
             all_subsections.extend(subsections)
 
-        all_subsections.sort(key=lambda x: x['relevance_score'], reverse=True)
+        top_subsections = heapq.nlargest(10, all_subsections, key=lambda x: x['relevance_score'])
 
         return {
             "metadata": {
@@ -256,9 +402,29 @@ class PersonaDrivenAnalyzer:
                 }
                 for section in top_sections
             ],
-            "sub_section_analysis": all_subsections[:10]
+            "sub_section_analysis": top_subsections
         }
 
+def _extract_and_score(doc_path: str, relevant_keywords: FrozenSet[str]) -> Tuple[str, Dict[str, Any]]:
+    # Runs in a worker process: extract one document and score its sections
+    analyzer = PersonaDrivenAnalyzer()
+    content = analyzer.extract_document_content(doc_path)
+    # Columns are only needed for scoring; don't ship them back to the parent process
+    columns = content.pop('columns')
+    scores = analyzer.score_sections(columns, relevant_keywords)
+    for section, relevance_score in zip(content['sections'], scores):
+        section['document'] = os.path.basename(doc_path)
+        section['importance_rank'] = relevance_score
+    return doc_path, content
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
 def main():
     input_dir = "/app/input"
     output_dir = "/app/output"
@@ -285,24 +451,22 @@ def main():
         print(f"Analyzing {len(documents)} documents for persona: {persona}")
         result = analyzer.analyze_documents(documents, persona, job)
         output_path = os.path.join(output_dir, "analysis_result.json")
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
+        _write_json(output_path, result)
         print(f"Analysis complete. Results saved to {output_path}")
     except Exception as e:
         print(f"Error during analysis: {str(e)}")
         output_path = os.path.join(output_dir, "analysis_result.json")
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump({
-                "metadata": {
-                    "input_documents": [os.path.basename(doc) for doc in documents],
-                    "persona": persona,
-                    "job_to_be_done": job,
-                    "processing_timestamp": datetime.now().isoformat(),
-                    "error": str(e)
-                },
-                "extracted_sections": [],
-                "sub_section_analysis": []
-            }, f, indent=2, ensure_ascii=False)
+        _write_json(output_path, {
+            "metadata": {
+                "input_documents": [os.path.basename(doc) for doc in documents],
+                "persona": persona,
+                "job_to_be_done": job,
+                "processing_timestamp": datetime.now().isoformat(),
+                "error": str(e)
+            },
+            "extracted_sections": [],
+            "sub_section_analysis": []
+        })
 
 if __name__ == "__main__":
     main()
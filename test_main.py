@@ -0,0 +1,65 @@
+import fitz
+import pytest
+
+import main
+
+
+KEYWORDS = main.PersonaDrivenAnalyzer._resolve_keywords("Researcher", "Literature review")
+
+
+@pytest.mark.parametrize("text", [
+    "related work related work",
+    "the model model data related work work future work",
+    "related   work, and future work on the method",
+    "",
+])
+def test_fallback_matches_automaton(monkeypatch, text):
+    pytest.importorskip("ahocorasick")
+    with_automaton = main._count_keyword_matches(text, KEYWORDS)
+    monkeypatch.setattr(main, "ahocorasick", None)
+    assert main._count_keyword_matches(text, KEYWORDS) == with_automaton
+
+
+def test_fallback_counts_repeated_phrases(monkeypatch):
+    monkeypatch.setattr(main, "ahocorasick", None)
+    assert main._count_keyword_matches("related work related work", KEYWORDS) == (2, 4)
+
+
+def test_heading_merged_into_middle_of_block(tmp_path):
+    body = "Body text about the methodology and the results we observed in this study."
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Overview", fontsize=13, fontname="hebo")
+    y = 102
+    # Lines 12-14pt apart, so PyMuPDF puts the headings and body text in one block
+    for heading in ("3.2 Experimental Setup", "Why does the model matter?", None):
+        for _ in range(3):
+            page.insert_text((72, y), body, fontsize=10)
+            y += 12
+        if heading:
+            page.insert_text((72, y), heading, fontsize=13, fontname="hebo")
+            y += 14
+    pdf_path = str(tmp_path / "merged.pdf")
+    doc.save(pdf_path)
+
+    with fitz.open(pdf_path) as saved:
+        assert len(saved[0].get_text("blocks")) == 2
+    content = main.PersonaDrivenAnalyzer().extract_document_content(pdf_path)
+    assert [(s['title'], len(s['content'])) for s in content['sections']] == [
+        ('Overview', 3),
+        ('3.2 Experimental Setup', 3),
+        ('Why does the model matter?', 3),
+    ]
+
+
+def test_subsection_starting_a_page_reports_that_page():
+    # The page-2 sentence starts right after a '.' that ends page 1 and pushes the chunk past 300 chars
+    section = {'title': 'Methods', 'page': 1, 'document': 'a.pdf', 'content': [
+        {'text': "Method model algorithm experiment results analysis dataset benchmark model framework model.", 'page': 1},
+        {'text': "Methodology approach evaluation performance validation comparison technique works nicely.", 'page': 1},
+        {'text': "Next page methodology model algorithm experiment dataset benchmark evaluation performance "
+                 "framework technique implementation validation comparison results within limit.", 'page': 2},
+        {'text': "Tail words here.", 'page': 2},
+    ]}
+    subsections = main.PersonaDrivenAnalyzer().extract_subsections(section, KEYWORDS)
+    assert [s['page_number'] for s in subsections] == [2]